@@ -1,4 +1,12 @@
-from .logger import setup_logger
 from .config import config
 
-__all__ = ["setup_logger", "config"]
\ No newline at end of file
+__all__ = ["setup_logger", "config"]
+
+
+def __getattr__(name):
+    # Imported on first use, so `src.config` alone does not load loguru.
+    if name == "setup_logger":
+        from .logger import setup_logger
+
+        return setup_logger
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,10 +1,12 @@
 from src.paper import ArxivPaper
-from tqdm import tqdm
+from html import escape
+from email.charset import Charset
 from email.header import Header
 from email.mime.text import MIMEText
 from email.utils import parseaddr, formataddr
 import smtplib
 import datetime
+import textwrap
 from loguru import logger
 from typing import Union, List
 
@@ -47,11 +49,7 @@ To unsubscribe, remove your email in your Github Action setting.
 """
 
 
-def get_empty_html() -> str:
-    """
-    Get the empty html for the email.
-    """
-    block_template = """
+_EMPTY_TEMPLATE = """
     <table border="0" cellpadding="0" cellspacing="0" width="100%" style="font-family: Arial, sans-serif; border: 1px solid #ddd; border-radius: 8px; padding: 16px; background-color: #f9f9f9;">
     <tr>
     <td style="font-size: 20px; font-weight: bold; color: #333;">
@@ -60,23 +58,9 @@ def get_empty_html() -> str:
     </tr>
     </table>
     """
-    return block_template
-
 
-def get_block_html(
-    title: str,
-    authors: Union[str, List[str]],
-    arxiv_id: str,
-    abstract: str,
-    pdf_url: str,
-) -> str:
-    # Format authors properly - join list with commas or use string as is
-    if isinstance(authors, list):
-        authors_formatted = ", ".join(authors)
-    else:
-        authors_formatted = authors or ""
 
-    block_template = """
+_BLOCK_TEMPLATE = """
     <table border="0" cellpadding="0" cellspacing="0" width="100%" style="font-family: Arial, sans-serif; border: 1px solid #ddd; border-radius: 8px; padding: 16px; background-color: #f9f9f9;">
     <tr>
         <td style="font-size: 20px; font-weight: bold; color: #333;">
@@ -107,33 +91,218 @@ def get_block_html(
     </tr>
 </table>
 """
-    return block_template.format(
-        title=title,
-        authors=authors_formatted,
-        arxiv_id=arxiv_id,
-        abstract=abstract,
-        pdf_url=pdf_url,
+
+
+def get_empty_html() -> str:
+    """
+    Get the empty html for the email.
+    """
+    return _EMPTY_TEMPLATE
+
+
+def get_block_html(
+    title: str,
+    authors: Union[str, List[str]],
+    arxiv_id: str,
+    abstract: str,
+    pdf_url: str,
+) -> str:
+    # Every field is escaped here, so callers pass raw paper metadata.
+    # Format authors properly - join list with commas or use string as is
+    if isinstance(authors, list):
+        authors_formatted = ", ".join(escape(a) for a in authors)
+    else:
+        authors_formatted = escape(authors or "")
+
+    return _BLOCK_TEMPLATE.format_map(
+        {
+            "title": escape(title),
+            "authors": authors_formatted,
+            "arxiv_id": escape(arxiv_id),
+            "abstract": escape(abstract),
+            "pdf_url": escape(pdf_url or ""),
+        }
     )
 
 
 def render_email(papers: list[ArxivPaper]):
-    parts = []
     if len(papers) == 0:
         return framework.replace("__CONTENT__", get_empty_html())
 
-    for p in tqdm(papers, desc="Rendering Email"):
-        parts.append(
-            get_block_html(
-                title=p.title,
-                authors=p.authors,
-                arxiv_id=p.arxiv_id,
-                abstract=p.summary,
-                pdf_url=p.pdf_url,
+    blocks = (
+        get_block_html(
+            title=p.title,
+            authors=p.authors,
+            arxiv_id=p.arxiv_id,
+            abstract=p.summary,
+            pdf_url=p.pdf_url,
+        )
+        for p in papers
+    )
+    content = "<br>".join(blocks)
+    return framework.replace("__CONTENT__", content)
+
+
+# Seconds before giving up on an unresponsive SMTP server.
+SMTP_TIMEOUT = 30
+
+
+def _format_addr(s):
+    name, addr = parseaddr(s)
+    return formataddr((Header(name, "utf-8").encode(), addr))
+
+
+# RFC 5322 caps lines at 998 octets, excluding the CRLF.
+MAX_LINE_OCTETS = 998
+# Wrap width in characters; even at 4 UTF-8 bytes each it stays under the cap.
+_WRAP_WIDTH = MAX_LINE_OCTETS // 4
+
+
+def _fits_8bit(html: str) -> bool:
+    # Longer lines still need QP/base64.
+    return all(
+        len(line.encode("utf-8")) <= MAX_LINE_OCTETS for line in html.splitlines()
+    )
+
+
+def _wrap_long_lines(html: str) -> str:
+    # Abstracts land on a single template line and often run past the cap.
+    # HTML treats a newline like a space, so breaking at whitespace keeps the
+    # rendering. Words are never split; a line that cannot be wrapped stays
+    # long and the message falls back to QP/base64.
+    return "\n".join(
+        line
+        if len(line.encode("utf-8")) <= MAX_LINE_OCTETS
+        else "\n".join(
+            textwrap.wrap(
+                line, _WRAP_WIDTH, break_long_words=False, break_on_hyphens=False
             )
         )
+        for line in html.splitlines()
+    )
 
-    content = "<br>" + "</br><br>".join(parts) + "</br>"
-    return framework.replace("__CONTENT__", content)
+
+def build_message(
+    sender: str, receiver: str, html: str, eight_bit: bool = False
+) -> MIMEText:
+    if eight_bit:
+        # Send the UTF-8 body as-is instead of quoted-printable encoding it.
+        charset = Charset("utf-8")
+        charset.body_encoding = None
+    else:
+        charset = "utf-8"
+    msg = MIMEText(html, "html", charset)
+    msg["From"] = _format_addr("Github Action <%s>" % sender)
+    msg["To"] = _format_addr("You <%s>" % receiver)
+    today = datetime.datetime.now().strftime("%Y/%m/%d")
+    msg["Subject"] = Header(f"Daily arXiv {today}", "utf-8").encode()
+    return msg
+
+
+class SMTPSession:
+    """
+    Authenticated SMTP connection that stays open across sends.
+
+    The connection is opened on first use (or on entering the context) and
+    reused for every following message, so the TLS handshake and login are
+    paid once per session rather than once per email.
+    """
+
+    def __init__(self, sender: str, password: str, smtp_server: str, smtp_port: int):
+        self.sender = sender
+        self.password = password
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.server = None
+        # True until the first send on a new connection, which needs no NOOP.
+        self._fresh = False
+
+    def __enter__(self) -> "SMTPSession":
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def connect(self):
+        # Drop any previous connection rather than leaking its socket.
+        self.close()
+        # Pick the transport from the port, so SSL-only servers do not cost a
+        # failed STARTTLS handshake first. Unknown ports keep the TLS-then-SSL
+        # fallback.
+        if self.smtp_port == 465:
+            server = smtplib.SMTP_SSL(
+                self.smtp_server, self.smtp_port, timeout=SMTP_TIMEOUT
+            )
+        elif self.smtp_port in (25, 587):
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=SMTP_TIMEOUT)
+            server.ehlo()
+            if self.smtp_port == 587 or server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
+        else:
+            try:
+                server = smtplib.SMTP(
+                    self.smtp_server, self.smtp_port, timeout=SMTP_TIMEOUT
+                )
+                server.starttls()
+            except Exception as e:
+                logger.warning(f"Failed to use TLS. {e}")
+                logger.warning(f"Try to use SSL.")
+                server = smtplib.SMTP_SSL(
+                    self.smtp_server, self.smtp_port, timeout=SMTP_TIMEOUT
+                )
+
+        server.login(self.sender, self.password)
+        self.server = server
+        self._fresh = True
+
+    def is_alive(self) -> bool:
+        if self.server is None:
+            return False
+        try:
+            return self.server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    def send(self, receiver: str, html: str):
+        # A connection opened moments ago is trusted without a NOOP round trip.
+        if not (self._fresh or self.is_alive()):
+            self.connect()
+        try:
+            self._sendmail(receiver, html)
+        except smtplib.SMTPException as e:
+            # The server may have dropped an idle connection; reconnect once.
+            logger.warning(f"Failed to send email, reconnecting. {e}")
+            self.connect()
+            self._sendmail(receiver, html)
+        finally:
+            self._fresh = False
+
+    def _sendmail(self, receiver: str, html: str):
+        html = _wrap_long_lines(html)
+        eight_bit = self.server.has_extn("8bitmime") and _fits_8bit(html)
+        msg = build_message(self.sender, receiver, html, eight_bit=eight_bit)
+        if eight_bit:
+            self.server.sendmail(
+                self.sender,
+                [receiver],
+                msg.as_bytes(),
+                mail_options=["BODY=8BITMIME"],
+            )
+        else:
+            self.server.sendmail(self.sender, [receiver], msg.as_string())
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            # Already dropped or broken; just release the socket.
+            self.server.close()
+        self.server = None
+        self._fresh = False
 
 
 def send_email(
@@ -144,24 +313,5 @@ def send_email(
     smtp_port: int,
     html: str,
 ):
-    def _format_addr(s):
-        name, addr = parseaddr(s)
-        return formataddr((Header(name, "utf-8").encode(), addr))
-
-    msg = MIMEText(html, "html", "utf-8")
-    msg["From"] = _format_addr("Github Action <%s>" % sender)
-    msg["To"] = _format_addr("You <%s>" % receiver)
-    today = datetime.datetime.now().strftime("%Y/%m/%d")
-    msg["Subject"] = Header(f"Daily arXiv {today}", "utf-8").encode()
-
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-    except Exception as e:
-        logger.warning(f"Failed to use TLS. {e}")
-        logger.warning(f"Try to use SSL.")
-        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-
-    server.login(sender, password)
-    server.sendmail(sender, [receiver], msg.as_string())
-    server.quit()
+    with SMTPSession(sender, password, smtp_server, smtp_port) as session:
+        session.send(receiver, html)
@@ -0,0 +1,175 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds.
+_MAX_IN_PARAMS = 500
+
+
+def quantize(embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization.
+
+    Returns:
+        int8 matrix and the float32 per-row scale to multiply it back with
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scale = np.abs(embeddings).max(axis=1) / 127
+    scale[scale == 0] = 1
+    q = np.rint(embeddings / scale[:, None]).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+class CorpusDatabase:
+    """
+    Local SQLite cache for the Zotero corpus and data derived from it.
+
+    Holds the last retrieved corpus together with the Zotero library version
+    it was fetched at, the abstract embeddings used by the reranker, so that
+    only new or edited items have to be encoded, and the weighted corpus
+    centroid, so that an unchanged corpus needs no corpus-side work at all.
+    """
+
+    def __init__(self, db_path: str = "data/corpus.db"):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._init_database()
+
+    def _init_database(self) -> None:
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS corpus_embeddings (
+                item_key TEXT NOT NULL,
+                embedding_model TEXT NOT NULL,
+                sha1 BLOB NOT NULL,
+                dim INTEGER NOT NULL,
+                scale REAL NOT NULL,
+                vec BLOB NOT NULL,
+                PRIMARY KEY (item_key, embedding_model)
+            );
+            CREATE TABLE IF NOT EXISTS corpus (
+                zotero_key TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS rerank_state (
+                embedding_model TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                centroid BLOB NOT NULL
+            );
+            """
+        )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def load_corpus(self) -> list[dict]:
+        """Return the corpus saved by the last store_corpus call."""
+        rows = self._conn.execute("SELECT data FROM corpus ORDER BY rowid")
+        return [json.loads(data) for (data,) in rows]
+
+    def store_corpus(self, corpus: list[dict]) -> None:
+        """Replace the saved corpus with `corpus` (Zotero item dicts)."""
+        with self._conn:
+            self._conn.execute("DELETE FROM corpus")
+            self._conn.executemany(
+                "INSERT INTO corpus (zotero_key, data) VALUES (?, ?)",
+                ((c["key"], json.dumps(c)) for c in corpus),
+            )
+
+    def get_embeddings(
+        self, keys: Sequence[str], digests: Sequence[bytes], model: str
+    ) -> dict[str, np.ndarray]:
+        """
+        Look up cached embeddings that are still current.
+
+        Args:
+            keys: Zotero item keys
+            digests: SHA-1 of each item's abstract, parallel to `keys`
+            model: Name of the model that produced the embeddings
+
+        Returns:
+            Mapping from item key to its dequantized float32 embedding, for
+            keys whose cached embedding was computed from the same abstract
+        """
+        expected = dict(zip(keys, digests))
+        keys = list(expected)
+        found = {}
+        for i in range(0, len(keys), _MAX_IN_PARAMS):
+            batch = keys[i : i + _MAX_IN_PARAMS]
+            rows = self._conn.execute(
+                f"SELECT item_key, sha1, scale, vec FROM corpus_embeddings "
+                f"WHERE embedding_model = ? AND item_key IN ({','.join('?' * len(batch))})",
+                (model, *batch),
+            )
+            for key, sha1, scale, blob in rows:
+                if sha1 == expected[key]:
+                    found[key] = np.frombuffer(blob, dtype=np.int8) * np.float32(scale)
+        return found
+
+    def store_embeddings(
+        self,
+        keys: Iterable[str],
+        digests: Iterable[bytes],
+        embeddings: np.ndarray,
+        model: str,
+    ) -> None:
+        """
+        Insert or replace the embeddings of `keys`, one row of `embeddings` each.
+
+        Vectors are stored int8-quantized, a quarter of their float32 size.
+        """
+        q, scales = quantize(embeddings)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO corpus_embeddings "
+                "(item_key, embedding_model, sha1, dim, scale, vec) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (key, model, sha1, vec.shape[0], float(scale), vec.tobytes())
+                    for key, sha1, scale, vec in zip(keys, digests, scales, q)
+                ),
+            )
+
+    def get_centroid(self, signature: bytes, model: str) -> Optional[np.ndarray]:
+        """
+        Return the weighted corpus centroid saved for `model`, or None if it
+        was computed from a different corpus than `signature` describes.
+        """
+        row = self._conn.execute(
+            "SELECT signature, centroid FROM rerank_state WHERE embedding_model = ?",
+            (model,),
+        ).fetchone()
+        if row is None or row[0] != signature:
+            return None
+        return np.frombuffer(row[1], dtype=np.float32)
+
+    def store_centroid(self, signature: bytes, centroid: np.ndarray, model: str) -> None:
+        """Save the weighted corpus centroid for `model`, replacing the old one."""
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rerank_state "
+                "(embedding_model, signature, centroid) VALUES (?, ?, ?)",
+                (model, signature, np.asarray(centroid, dtype=np.float32).tobytes()),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
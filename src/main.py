@@ -1,23 +1,34 @@
 import os
 import sys
 
-from dotenv import load_dotenv
-
-from src.logger import setup_logger
 from src.config import config
-from src.paper import get_zotero_corpus, get_arxiv_paper, rerank_paper
-from src.construct_email import render_email, send_email
-
-load_dotenv(override=True)
-ZOTERO_ID = os.getenv("ZOTERO_ID")
-ZOTERO_KEY = os.getenv("ZOTERO_KEY")
-SENDER = os.getenv("SENDER")
-RECEIVER = os.getenv("RECEIVER")
-SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
 
 if __name__ == "__main__":
 
     args = config()
+
+    # Heavy imports are deferred until argument parsing succeeded, so that
+    # `--help` and invalid invocations return without loading them.
+    from dotenv import load_dotenv
+
+    from src.logger import setup_logger
+    from src.paper import (
+        build_corpus_view,
+        filter_corpus,
+        get_zotero_corpus,
+        iter_arxiv_batches,
+        rerank_paper,
+    )
+    from src.construct_email import render_email, send_email
+    from src.database import CorpusDatabase
+
+    load_dotenv(override=True)
+    ZOTERO_ID = os.getenv("ZOTERO_ID")
+    ZOTERO_KEY = os.getenv("ZOTERO_KEY")
+    SENDER = os.getenv("SENDER")
+    RECEIVER = os.getenv("RECEIVER")
+    SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
+
     logger = setup_logger(args.debug)
     if args.debug:
         logger.remove()
@@ -27,19 +38,26 @@ if __name__ == "__main__":
         logger.remove()
         logger.add(sys.stdout, level="INFO")
 
+    db = CorpusDatabase()
+
     logger.info("Retrieving Zotero corpus...")
 
-    corpus = get_zotero_corpus(ZOTERO_ID, ZOTERO_KEY)
+    corpus = get_zotero_corpus(ZOTERO_ID, ZOTERO_KEY, db=db)
     logger.info(f"Retrieved {len(corpus)} papers from Zotero.")
+    if args.zotero_ignore:
+        logger.info(f"Ignoring papers in:\n {args.zotero_ignore}...")
+        corpus = filter_corpus(corpus, args.zotero_ignore)
+        logger.info(f"Remaining {len(corpus)} papers after filtering.")
 
-    logger.info("Retrieving Arxiv papers...")
-    papers = get_arxiv_paper(args.arxiv_query, args.debug)
-    if args.max_paper_num == -1:
-        logger.info(f"Retrieved {len(papers)} papers from Arxiv.")
-    else:
-        logger.info(
-            f"Retrieved {max(args.max_paper_num, len(papers))} papers from Arxiv."
-        )
+    logger.info("Retrieving and reranking Arxiv papers...")
+    papers = rerank_paper(
+        iter_arxiv_batches(args.arxiv_query, args.debug),
+        build_corpus_view(corpus),
+        max_k=None if args.max_paper_num == -1 else args.max_paper_num,
+        db=db,
+    )
+    db.close()
+    logger.info(f"Selected {len(papers)} papers from Arxiv.")
 
     if len(papers) == 0:
         logger.info(
@@ -47,11 +65,6 @@ if __name__ == "__main__":
         )
         if not args.send_empty:
             exit(0)
-    else:
-        logger.info("Reranking papers...")
-        papers = rerank_paper(papers, corpus)
-        if args.max_paper_num != -1:
-            papers = papers[: args.max_paper_num]
 
     html = render_email(papers)
     logger.info("Sending email...")
@@ -1,145 +1,770 @@
-import arxiv
+from __future__ import annotations
+
+import hashlib
+import heapq
 import re
-import feedparser
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from xml.etree import ElementTree
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, NamedTuple, Optional
 
 import numpy as np
 from loguru import logger
-from tqdm import tqdm
-from pyzotero import zotero
-from sentence_transformers import SentenceTransformer
 from datetime import datetime, timezone
 
+if TYPE_CHECKING:
+    import arxiv
+
+    from src.database import CorpusDatabase
+
+
+# Parallel arXiv API requests; kept small to stay within arXiv's rate limits.
+ARXIV_FETCH_WORKERS = 4
+# Keep-alive connections per host, shared by all fetch threads.
+HTTP_POOL_SIZE = 16
+# Zotero API page size (its maximum) and number of pages fetched in parallel.
+ZOTERO_PAGE_SIZE = 100
+ZOTERO_FETCH_WORKERS = 4
+# Newest corpus items the reranker compares candidates against.
+MAX_CORPUS_FOR_RERANK = 2000
+
+_VERSION_SUFFIX = re.compile(r"v\d+$")
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_ARXIV = "{http://arxiv.org/schemas/atom}"
+_DC = "{http://purl.org/dc/elements/1.1/}"
+_NAME_SUFFIX = re.compile(r"(?:Jr|Sr)\.?|I{2,3}|IV", re.IGNORECASE)
+# RSS summaries read "arXiv:<id> Announce Type: new\nAbstract: <abstract>".
+_ANNOUNCE_PREFIX = re.compile(
+    r"^\s*arXiv:\S+\s+Announce Type:\s*\S+\s*Abstract:\s*"
+)
+
 
 class ArxivPaper:
-    def __init__(self, paper: arxiv.Result):
-        self._paper = paper
-        self.title = paper.title
-        self.summary = paper.summary
-        self.authors = [a.name for a in paper.authors]
-        self.arxiv_id = re.sub(r"v\d+$", "", paper.get_short_id())
-        self.pdf_url = paper.pdf_url
-
-
-def get_arxiv_paper(query: str, debug: bool = False) -> list[ArxivPaper]:
-    client = arxiv.Client(num_retries=10, delay_seconds=10)
-    feed = feedparser.parse(f"https://rss.arxiv.org/atom/{query}")
-    if "Feed error for query" in feed.feed.title:
-        raise Exception(f"Invalid ARXIV_QUERY: {query}.")
+    def __init__(
+        self,
+        title: str,
+        summary: str,
+        authors: list[str],
+        arxiv_id: str,
+        pdf_url: str,
+        result: Optional[arxiv.Result] = None,
+    ):
+        self._paper = result
+        self.title = title
+        self.summary = summary
+        self.authors = authors
+        self.arxiv_id = _VERSION_SUFFIX.sub("", arxiv_id)
+        self.pdf_url = pdf_url
+
+    @classmethod
+    def from_result(cls, paper: arxiv.Result) -> ArxivPaper:
+        """Build a paper from an arXiv API search result."""
+        return cls(
+            title=paper.title,
+            summary=paper.summary,
+            authors=[a.name for a in paper.authors],
+            arxiv_id=paper.get_short_id(),
+            pdf_url=paper.pdf_url,
+            result=paper,
+        )
+
+    @classmethod
+    def from_feed_entry(cls, entry: ElementTree.Element) -> Optional[ArxivPaper]:
+        """
+        Build a paper from an arXiv RSS Atom entry.
+
+        Returns None if the entry lacks a title, abstract or authors, in which
+        case the paper has to be fetched from the arXiv API instead.
+        """
+        short_id = entry.findtext(_ATOM + "id", "").strip()
+        short_id = short_id.removeprefix("oai:arXiv.org:")
+        title = " ".join(entry.findtext(_ATOM + "title", "").split())
+        summary = entry.findtext(_ATOM + "summary", "")
+        summary = _ANNOUNCE_PREFIX.sub("", summary).strip()
+        authors = [
+            name
+            for creator in entry.iterfind(_DC + "creator")
+            for name in _split_creators(creator.text or "")
+        ] or [
+            a.text.strip()
+            for a in entry.iterfind(f"{_ATOM}author/{_ATOM}name")
+            if a.text and a.text.strip()
+        ]
+        if not (short_id and title and summary and authors):
+            return None
+        pdf_links = [
+            link.get("href")
+            for link in entry.iterfind(_ATOM + "link")
+            if link.get("type") == "application/pdf" or link.get("title") == "pdf"
+        ]
+        return cls(
+            title=title,
+            summary=summary,
+            authors=authors,
+            arxiv_id=short_id,
+            pdf_url=pdf_links[0] if pdf_links else f"https://arxiv.org/pdf/{short_id}",
+        )
+
+
+def _split_creators(text: str) -> list[str]:
+    """
+    Split the comma-separated author list of an RSS `dc:creator`.
+
+    Commas also separate name suffixes ("Smith, Jr."), so a part that is only
+    a suffix is joined back onto the preceding name.
+    """
+    names = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if names and _NAME_SUFFIX.fullmatch(part):
+            names[-1] = f"{names[-1]}, {part}"
+        else:
+            names.append(part)
+    return names
+
+
+@lru_cache(maxsize=1)
+def _get_session():
+    """
+    Shared keep-alive HTTP session for the RSS feed and every arxiv.Client.
+
+    Connections are pooled across the fetch threads, and transient errors are
+    retried with backoff before they reach the caller.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.headers["User-Agent"] = "zotero-arxiv-daily/1.0"
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        # Hand the last error response back instead of raising RetryError,
+        # so arxiv.Client still sees the status and runs its own retries.
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _parse_new_entries(stream, query: str) -> dict[str, Optional[ArxivPaper]]:
+    """
+    Stream-parse the arXiv Atom feed for the entries announced as "new".
+
+    Entries are cleared as soon as they are read, so the full document is
+    never held in memory.
+
+    Returns:
+        Mapping from arXiv ID to the paper built from its entry, or None if
+        the entry was incomplete; in feed order, without duplicates
+    """
+    entries = {}
+    depth = 0
+    for event, elem in ElementTree.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if elem.tag == _ATOM + "title" and depth == 1:
+            if "Feed error for query" in (elem.text or ""):
+                raise Exception(f"Invalid ARXIV_QUERY: {query}.")
+        elif elem.tag == _ATOM + "entry":
+            if elem.findtext(_ARXIV + "announce_type") == "new":
+                short_id = elem.findtext(_ATOM + "id", "").strip()
+                short_id = short_id.removeprefix("oai:arXiv.org:")
+                # An entry without an ID cannot be looked up either; skip it.
+                if short_id:
+                    entries.setdefault(short_id, ArxivPaper.from_feed_entry(elem))
+            elem.clear()
+    return entries
+
+
+def iter_arxiv_batches(
+    query: str, debug: bool = False, batch_size: int = 50
+) -> Iterator[list[ArxivPaper]]:
+    """
+    Yield today's new arXiv papers in batches of `batch_size`.
+
+    Papers are built straight from the RSS feed. Only entries missing
+    metadata are looked up through the arXiv API, concurrently on a small
+    thread pool, and yielded as they complete.
+    """
+    import arxiv
+    from tqdm import tqdm
+
+    session = _get_session()
+    response = session.get(
+        f"https://rss.arxiv.org/atom/{query}", stream=True, timeout=30
+    )
+    response.raise_for_status()
+    response.raw.decode_content = True
+    entries = _parse_new_entries(response.raw, query)
     if not debug:
-        # TODO: why not just use the feed directly, compared with arxiv.Search?
-        papers = []
-        all_paper_ids = [
-            i.id.removeprefix("oai:arXiv.org:")
-            for i in feed.entries
-            if i.arxiv_announce_type == "new"
+        papers = [p for p in entries.values() if p is not None]
+        missing_ids = [i for i, p in entries.items() if p is None]
+        logger.info(
+            f"Found {len(entries)} new papers on Arxiv, "
+            f"{len(missing_ids)} to be retrieved from the Arxiv API."
+        )
+        for i in range(0, len(papers), batch_size):
+            yield papers[i : i + batch_size]
+
+        # arxiv.Client tracks its last request time and is not thread-safe, so
+        # every worker thread gets its own client on top of the shared pool.
+        local = threading.local()
+
+        def fetch(ids: list[str]) -> list[ArxivPaper]:
+            if not hasattr(local, "client"):
+                local.client = arxiv.Client(num_retries=10, delay_seconds=10)
+                local.client._session = session
+            search = arxiv.Search(id_list=ids)
+            return [ArxivPaper.from_result(p) for p in local.client.results(search)]
+
+        id_batches = [
+            missing_ids[i : i + batch_size]
+            for i in range(0, len(missing_ids), batch_size)
         ]
-        bar = tqdm(total=len(all_paper_ids), desc="Retrieving Arxiv papers")
-        for i in range(0, len(all_paper_ids), 50):
-            search = arxiv.Search(id_list=all_paper_ids[i : i + 50])
-            batch = [ArxivPaper(p) for p in client.results(search)]
-            bar.update(len(batch))
-            papers.extend(batch)
-        bar.close()
+        if not id_batches:
+            return
+        # Batches are yielded as they complete, so reranking overlaps with the
+        # batches still in flight.
+        with ThreadPoolExecutor(max_workers=ARXIV_FETCH_WORKERS) as executor:
+            futures = [executor.submit(fetch, ids) for ids in id_batches]
+            for future in tqdm(
+                as_completed(futures),
+                total=len(futures),
+                desc="Retrieving Arxiv papers",
+                unit="batch",
+            ):
+                yield future.result()
 
     else:
         logger.debug("Retrieve 5 arxiv papers regardless of the date.")
+        client = arxiv.Client(num_retries=10, delay_seconds=10)
+        client._session = session
         search = arxiv.Search(
             query="cat:cs.AI", sort_by=arxiv.SortCriterion.SubmittedDate
         )
         papers = []
         for i in client.results(search):
-            papers.append(ArxivPaper(i))
+            papers.append(ArxivPaper.from_result(i))
             if len(papers) == 5:
                 break
+        yield papers
 
-    return papers
 
-
-def get_zotero_corpus(id: str, key: str, save_to_db: bool = True) -> list[dict]:
+def get_zotero_corpus(
+    id: str, key: str, db: Optional[CorpusDatabase] = None
+) -> list[dict]:
     """
     Retrieve Zotero corpus and optionally save to local database.
-    Only retrieves items added after the last request to avoid duplicates.
+    If the library version is unchanged since the corpus was last saved to
+    `db`, the saved corpus is returned without downloading anything.
 
     Args:
         id: Zotero user ID
         key: Zotero API key
-        save_to_db: Whether to save corpus to local database
+        db: Local database to load the corpus from and save it to
 
     Returns:
         Filtered corpus with abstracts
     """
-    zot = zotero.Zotero(id, "user", key)
-    collections = zot.everything(zot.collections())
-    collections = {c["key"]: c for c in collections}
-    logger.info("No previous Zotero request found, retrieving all items")
-    # Get all items if this is the first request
-    # TODO: save the items to the database, and only retrieve the items that are not in the database
-    corpus = zot.everything(
-        zot.items(
-            itemType="conferencePaper || journalArticle || preprint || WebPage || Book || computerProgram || Dataset || Manuscript || Note || Report || Thesis"
-        )
-    )
-    logger.info(f"Retrieved {len(corpus)} total items")
+    from pyzotero import zotero
+
+    version_key = f"zotero_version:{id}"
+    if db is not None:
+        version = zotero.Zotero(id, "user", key).last_modified_version()
+        if db.get_meta(version_key) == str(version):
+            corpus = db.load_corpus()
+            logger.info(
+                f"Zotero library unchanged at version {version}, loaded {len(corpus)} items from database"
+            )
+            return corpus
+
+    logger.info("Zotero library changed or not saved yet, retrieving all items")
+    # TODO: only retrieve the items that changed since the saved version
+    item_type = "conferencePaper || journalArticle || preprint || WebPage || Book || computerProgram || Dataset || Manuscript || Note || Report || Thesis"
+    # pyzotero keeps per-request state (links, params) on the instance, so each
+    # concurrent request gets a client of its own thread.
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "zot"):
+            local.zot = zotero.Zotero(id, "user", key)
+        return local.zot
+
+    def fetch_collections() -> dict[str, dict]:
+        return {c["key"]: c for c in _iter_collections(client())}
 
-    # Filter to only include items with abstracts
-    corpus_with_abstracts = [c for c in corpus if c["data"]["abstractNote"] != ""]
+    def fetch_page(start: int) -> tuple[list[dict], set[str], int, int]:
+        """
+        Fetch one page of items, keeping those with abstracts along with the
+        collections they belong to.
+        """
+        zot = client()
+        page = zot.items(itemType=item_type, start=start, limit=ZOTERO_PAGE_SIZE)
+        total = int(zot.request.headers.get("Total-Results", len(page)))
+        kept = []
+        referenced = set()
+        for c in page:
+            data = c["data"]
+            if not data.get("abstractNote"):
+                continue
+            referenced.update(data["collections"])
+            kept.append(c)
+        return kept, referenced, len(page), total
+
+    with ThreadPoolExecutor(max_workers=ZOTERO_FETCH_WORKERS) as executor:
+        f_collections = executor.submit(fetch_collections)
+        # The first page tells how many items there are; the rest are then
+        # requested concurrently.
+        corpus_with_abstracts, referenced, n_items, total = fetch_page(0)
+        pages = [
+            executor.submit(fetch_page, start)
+            for start in range(ZOTERO_PAGE_SIZE, total, ZOTERO_PAGE_SIZE)
+        ]
+        for f in pages:
+            kept, page_referenced, n_page, _ = f.result()
+            corpus_with_abstracts.extend(kept)
+            referenced |= page_referenced
+            n_items += n_page
+        collections = f_collections.result()
 
     logger.info(
-        f"Retrieved {len(corpus)} total items, {len(corpus_with_abstracts)} have abstracts"
+        f"Retrieved {n_items} total items, {len(corpus_with_abstracts)} have abstracts"
     )
     # Add collection paths
+    paths_by_key = get_collection_paths(collections, referenced)
     for c in corpus_with_abstracts:
-        paths = [
-            get_collection_path(collections, col) for col in c["data"]["collections"]
-        ]
-        c["paths"] = paths
+        c["paths"] = [paths_by_key[col] for col in c["data"]["collections"]]
 
-    # Record this Zotero request timestamp
-    current_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-    logger.info(
-        f"Recorded Zotero request at {current_time} with {len(corpus_with_abstracts)} items"
-    )
+    if db is not None:
+        db.store_corpus(corpus_with_abstracts)
+        db.set_meta(version_key, str(version))
+        # Record this Zotero request timestamp
+        current_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        logger.info(
+            f"Recorded Zotero request at {current_time} with {len(corpus_with_abstracts)} items"
+        )
 
     return corpus_with_abstracts
 
 
-def get_collection_path(collections: dict, col_key: str) -> str:
-    """Get the full path of a collection."""
-    if p := collections[col_key]["data"]["parentCollection"]:
-        return (
-            get_collection_path(collections, p)
-            + "/"
-            + collections[col_key]["data"]["name"]
+def _iter_collections(zot) -> Iterator[dict]:
+    """Yield every collection, one API page at a time."""
+    start = 0
+    while True:
+        page = zot.collections(start=start, limit=ZOTERO_PAGE_SIZE)
+        yield from page
+        start += len(page)
+        # Stop on the last page itself instead of asking for an empty one.
+        total = zot.request.headers.get("Total-Results")
+        if len(page) < ZOTERO_PAGE_SIZE or (total and start >= int(total)):
+            return
+
+
+def get_collection_paths(
+    collections: dict, keys: Optional[Iterable[str]] = None
+) -> dict[str, str]:
+    """
+    Map collection keys to their full slash-separated paths.
+
+    Only `keys` (all collections if None) and their ancestors are resolved.
+    Every path is memoized, so a shared ancestor is walked once and each
+    child path is built from its parent's path.
+    """
+    paths_by_key = {}
+    for key in collections if keys is None else keys:
+        chain = []
+        k = key
+        while k and k not in paths_by_key:
+            chain.append(k)
+            k = collections[k]["data"]["parentCollection"]
+        prefix = paths_by_key[k] if k else ""
+        for k in reversed(chain):
+            name = collections[k]["data"]["name"]
+            prefix = f"{prefix}/{name}" if prefix else name
+            paths_by_key[k] = prefix
+    return paths_by_key
+
+
+def _glob_to_regex(glob: str) -> str:
+    """
+    Translate one gitignore glob into a regex source over slash-separated paths.
+
+    `*`, `?` and `[...]` never match a slash; `**/` and `/**/` match across
+    any number of path components. A trailing `/**` matches everything inside
+    a collection, which here includes the items filed in the collection
+    itself.
+
+    Raises:
+        re.error: For a bracket expression git would not match, e.g. a
+            reversed range or a nested `[`
+    """
+    out = []
+    i, n = 0, len(glob)
+    while i < n:
+        at_component_start = i == 0 or glob[i - 1] == "/"
+        if glob.startswith("/**", i) and i + 3 == n:
+            out.append("(?:/.*)?")
+            i += 3
+        elif at_component_start and glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif at_component_start and glob.startswith("**", i) and i + 2 == n:
+            out.append(".*")
+            i += 2
+        elif glob[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif glob[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif glob[i] == "[" and (j := glob.find("]", i + 2)) != -1:
+            body = glob[i + 1 : j].replace("\\", "\\\\")
+            if "[" in body:
+                raise re.error(f"nested set in {glob!r}")
+            if body[0] in "!^":
+                body = "^/" + body[1:]
+            out.append(f"[{body}]")
+            i = j + 1
+        elif glob[i] == "\\" and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(glob[i]))
+            i += 1
+    return "".join(out)
+
+
+class _IgnoreRule(NamedTuple):
+    negated: bool
+    # Anchored rules match whole paths from the root, the others a
+    # collection of that name at any depth.
+    anchored: bool
+    glob: str
+
+    @property
+    def is_literal(self) -> bool:
+        return not any(ch in self.glob for ch in "*?[\\")
+
+    def regex(self) -> str:
+        regex = _glob_to_regex(self.glob)
+        return regex if self.anchored else f"(?:.*/)?{regex}"
+
+
+def _parse_ignore_line(line: str) -> Optional[_IgnoreRule]:
+    """
+    Parse one gitignore line, or return None if it is blank or a comment.
+
+    Collections are directories, so a trailing slash changes nothing. A
+    pattern with a slash anywhere else is anchored at the library root; one
+    without matches a collection of that name at any depth.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated or line.startswith(("\\!", "\\#")):
+        line = line[1:]
+    line = line.rstrip("/")
+    if not line:
+        return None
+    return _IgnoreRule(negated, "/" in line, line.lstrip("/"))
+
+
+@lru_cache(maxsize=None)
+def _ignore_matcher(pattern: str) -> Callable[[str], bool]:
+    """
+    Compile a gitignore-style pattern into a collection path matcher.
+
+    Cached on the pattern string, so the patterns are parsed once per process.
+    As in gitignore, the last rule matching a collection decides whether it
+    is ignored, `!` rules re-include, and everything below an ignored
+    collection is ignored too.
+    """
+    rules = [
+        rule
+        for rule in filter(None, map(_parse_ignore_line, pattern.splitlines()))
+        if rule.is_literal or _compiles(rule)
+    ]
+    if not any(rule.negated for rule in rules):
+        return _fused_ignore_matcher(rules)
+    # Reversed, so the first hit is the last matching rule.
+    compiled = [(rule.negated, re.compile(rule.regex())) for rule in reversed(rules)]
+
+    def ignored(prefix: str) -> bool:
+        for negated, regex in compiled:
+            if regex.fullmatch(prefix):
+                return not negated
+        return False
+
+    def match(path: str) -> bool:
+        # Walk from the root, e.g. "A", "A/B", "A/B/C"; like git, a collection
+        # below an ignored one cannot be re-included.
+        i = path.find("/")
+        while i != -1:
+            if ignored(path[:i]):
+                return True
+            i = path.find("/", i + 1)
+        return ignored(path)
+
+    return match
+
+
+def _compiles(rule: _IgnoreRule) -> bool:
+    # Git treats a malformed pattern as matching nothing; skip it rather
+    # than failing the run after the whole corpus was fetched.
+    try:
+        re.compile(rule.regex())
+    except re.error as e:
+        logger.warning(f"Skipping invalid ignore pattern {rule.glob!r}: {e}")
+        return False
+    return True
+
+
+def _fused_ignore_matcher(rules: list[_IgnoreRule]) -> Callable[[str], bool]:
+    """
+    Matcher for rules without `!`, where a path is ignored iff any rule
+    matches it or one of its ancestors, so rule order does not matter.
+
+    Literal names are looked up in a set against every path component,
+    anchored literal paths in a set against every ancestor, and all glob
+    rules are fused into one regex over the whole path.
+    """
+    names = frozenset(r.glob for r in rules if r.is_literal and not r.anchored)
+    paths = frozenset(r.glob for r in rules if r.is_literal and r.anchored)
+    globs = [r.regex() for r in rules if not r.is_literal]
+    # Matching an ancestor means matching a prefix that ends at a slash.
+    glob_re = re.compile(f"(?:{'|'.join(globs)})(?:/.*)?") if globs else None
+
+    def match(path: str) -> bool:
+        if names and not names.isdisjoint(path.split("/")):
+            return True
+        if paths:
+            i = path.find("/")
+            while i != -1:
+                if path[:i] in paths:
+                    return True
+                i = path.find("/", i + 1)
+            if path in paths:
+                return True
+        return glob_re is not None and glob_re.fullmatch(path) is not None
+
+    return match
+
+
+def filter_corpus(corpus: list[dict], pattern: str) -> list[dict]:
+    """Drop corpus items that live in a collection matched by `pattern`."""
+    matcher = _ignore_matcher(pattern)
+    return [c for c in corpus if not any(matcher(p) for p in c["paths"])]
+
+
+class CorpusView(NamedTuple):
+    """Corpus columns the reranker needs, ordered from newest to oldest."""
+
+    keys: list[str]
+    abstracts: list[str]
+
+
+def build_corpus_view(corpus: list[dict]) -> CorpusView:
+    """Extract item keys and abstracts once, skipping items without an abstract."""
+    # sort corpus by date, from newest to oldest; Zotero's dateAdded is
+    # "%Y-%m-%dT%H:%M:%SZ", which orders lexicographically like chronologically
+    corpus = sorted(
+        (c for c in corpus if c["data"].get("abstractNote")),
+        key=lambda x: x["data"]["dateAdded"],
+        reverse=True,
+    )
+    return CorpusView(
+        keys=[c["key"] for c in corpus],
+        abstracts=[c["data"]["abstractNote"] for c in corpus],
+    )
+
+
+@lru_cache(maxsize=4)
+def _get_encoder(model: str):
+    """
+    Load a SentenceTransformer once per process and model name.
+
+    Runs on CUDA in half precision when a GPU is available, on CPU otherwise.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    encoder = SentenceTransformer(model, device=device)
+    if device == "cuda":
+        encoder = encoder.half()
+    logger.debug(f"Loaded {model} on {device}.")
+    return encoder
+
+
+def encode_corpus(
+    encoder, corpus: CorpusView, model: str, db: Optional[CorpusDatabase] = None
+) -> np.ndarray:
+    """
+    Embed corpus abstracts, reusing embeddings cached in `db`.
+
+    Cache entries are keyed by item key and checked against the SHA-1 of the
+    abstract, so edited abstracts are re-encoded.
+
+    Returns:
+        [n_corpus, dim] float32 matrix of unit-norm rows, in corpus order
+    """
+    if db is None:
+        return _encode(encoder, corpus.abstracts)
+
+    keys = corpus.keys
+    digests = [hashlib.sha1(a.encode("utf-8")).digest() for a in corpus.abstracts]
+    cached = db.get_embeddings(keys, digests, model)
+    missing = [i for i, k in enumerate(keys) if k not in cached]
+    logger.debug(f"{len(cached)} corpus embeddings cached, encoding {len(missing)}.")
+    if missing:
+        new_feature = _encode(encoder, [corpus.abstracts[i] for i in missing])
+        db.store_embeddings(
+            [keys[i] for i in missing], [digests[i] for i in missing], new_feature, model
         )
-    else:
-        return collections[col_key]["data"]["name"]
+        cached.update(zip((keys[i] for i in missing), new_feature))
+    return np.stack([cached[k] for k in keys]).astype(np.float32, copy=False)
+
+
+def corpus_signature(corpus: CorpusView) -> bytes:
+    """
+    SHA-1 over the ordered keys and abstracts of `corpus`.
+
+    The weighted centroid depends on both the items and their order, so it
+    can be reused exactly when this digest is unchanged.
+    """
+    h = hashlib.sha1()
+    for key, abstract in zip(corpus.keys, corpus.abstracts):
+        h.update(key.encode("utf-8"))
+        h.update(b"\0")
+        h.update(abstract.encode("utf-8"))
+        h.update(b"\0")
+    return h.digest()
+
+
+def weighted_corpus_centroid(
+    encoder, corpus: CorpusView, model: str, db: Optional[CorpusDatabase] = None
+) -> np.ndarray:
+    """
+    Time-decay weighted sum of the corpus embeddings, newest items weighing most.
+
+    Rows are unit-norm, so the time-decayed sum of cosine similarities of a
+    candidate collapses into one dot product with this vector. With a `db`,
+    the centroid of an unchanged corpus is loaded instead of recomputed.
+
+    Returns:
+        [dim] float32 vector
+    """
+    if db is not None:
+        signature = corpus_signature(corpus)
+        centroid = db.get_centroid(signature, model)
+        if centroid is not None:
+            logger.debug("Corpus unchanged, reusing the saved corpus centroid.")
+            return centroid
+    # float32 like the embeddings, so the contraction below is a single sgemv
+    # instead of an upcast copy of the corpus matrix.
+    time_decay_weight = 1 / (
+        1 + np.log10(np.arange(len(corpus.keys), dtype=np.float32) + 1)
+    )
+    time_decay_weight /= time_decay_weight.sum()
+    corpus_feature = np.ascontiguousarray(encode_corpus(encoder, corpus, model, db))
+    centroid = np.einsum("nd,n->d", corpus_feature, time_decay_weight, optimize=True)
+    if db is not None:
+        db.store_centroid(signature, centroid, model)
+    return centroid
+
+
+def _encode(encoder, texts: list[str]) -> np.ndarray:
+    # Encode each distinct text once (libraries often hold duplicate entries)
+    # and scatter the rows back to the input order.
+    index = {}
+    inverse = np.fromiter(
+        (index.setdefault(t, len(index)) for t in texts),
+        dtype=np.intp,
+        count=len(texts),
+    )
+    on_gpu = encoder.device.type == "cuda"
+    feature = encoder.encode(
+        list(index),
+        batch_size=256 if on_gpu else 64,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    # fp16 GPU output is widened once here; scoring and the cache use float32.
+    return feature.astype(np.float32, copy=False)[inverse]
 
 
 def rerank_paper(
-    candidate: list[ArxivPaper],
-    corpus: list[dict],
+    candidate: Iterable[list[ArxivPaper]],
+    corpus: CorpusView,
     model: str = "avsolatorio/GIST-small-Embedding-v0",
+    max_k: Optional[int] = None,
+    db: Optional[CorpusDatabase] = None,
+    max_corpus: int = MAX_CORPUS_FOR_RERANK,
 ) -> list[ArxivPaper]:
+    """
+    Score candidate batches against the corpus and return them best first.
+
+    Args:
+        candidate: Batches of candidate papers, e.g. from iter_arxiv_batches
+        corpus: Corpus keys and abstracts, from build_corpus_view
+        model: SentenceTransformer model used to embed abstracts
+        max_k: Keep only the top `max_k` papers, or all of them if None
+        db: Embedding and centroid cache; corpus items already in it are not
+            re-encoded, and an unchanged corpus is not touched at all
+        max_corpus: Only compare against this many of the newest corpus items
+
+    Returns:
+        Candidates sorted by descending score, or in feed order if the
+        corpus is empty
+    """
     # TODO: rewrite the ranker function with RAG and local zotero corpus
-    encoder = SentenceTransformer(model)
-    # sort corpus by date, from newest to oldest
-    corpus = sorted(
-        corpus,
-        key=lambda x: datetime.strptime(x["data"]["dateAdded"], "%Y-%m-%dT%H:%M:%SZ"),
-        reverse=True,
-    )
-    time_decay_weight = 1 / (1 + np.log10(np.arange(len(corpus)) + 1))
-    time_decay_weight = time_decay_weight / time_decay_weight.sum()
-    corpus_feature = encoder.encode([paper["data"]["abstractNote"] for paper in corpus])
-    candidate_feature = encoder.encode([paper.summary for paper in candidate])
-    sim = encoder.similarity(
-        candidate_feature, corpus_feature
-    )  # [n_candidate, n_corpus]
-    scores = (sim * time_decay_weight).sum(axis=1) * 10  # [n_candidate]
-    for s, c in zip(scores, candidate):
-        c.score = s.item()
-    candidate = sorted(candidate, key=lambda x: x.score, reverse=True)
-    return candidate
+    if max_k == 0:
+        return []
+    if not corpus.keys:
+        # Nothing to compare against, e.g. a fresh library or everything
+        # ignored; keep the feed order rather than failing on an empty stack.
+        logger.warning("Zotero corpus is empty, papers are not reranked.")
+        papers = [paper for batch in candidate for paper in batch]
+        return papers if max_k is None else papers[:max_k]
+    if len(corpus.keys) > max_corpus:
+        # The corpus is ordered newest first and older items carry ever less
+        # time-decay weight, so the tail barely moves the scores.
+        corpus = CorpusView(corpus.keys[:max_corpus], corpus.abstracts[:max_corpus])
+    encoder = None
+    ranked = []
+    for batch in candidate:
+        if not batch:
+            continue
+        if encoder is None:
+            # Only pay for the model and the corpus embedding once a
+            # candidate actually shows up.
+            encoder = _get_encoder(model)
+            weighted_centroid = weighted_corpus_centroid(encoder, corpus, model, db)
+        candidate_feature = _encode(encoder, [paper.summary for paper in batch])
+        scores = candidate_feature @ weighted_centroid * 10  # [n_candidate]
+        for s, c in zip(scores, batch):
+            c.score = s.item()
+        ranked.extend(batch)
+        # Bounded selection only pays off once there is something to drop.
+        if max_k is not None and len(ranked) > max_k:
+            ranked = heapq.nlargest(max_k, ranked, key=lambda x: x.score)
+    ranked.sort(key=lambda x: x.score, reverse=True)
+    return ranked
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import pytest
+
+from src.paper import _ignore_matcher, filter_corpus
+
+
+def ignored(pattern: str, path: str) -> bool:
+    return _ignore_matcher(pattern)(path)
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [("B", True), ("A/B", True), ("A/B/C", True), ("AB", False), ("A/BC", False)],
+)
+def test_bare_name_matches_at_any_depth(path, expected):
+    assert ignored("B", path) is expected
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("A/B", "A/B", True),
+        ("A/B", "A/B/C", True),
+        ("A/B", "X/A/B", False),
+        ("/B", "B", True),
+        ("/B", "A/B", False),
+        ("B/", "A/B", True),
+    ],
+)
+def test_anchored_paths(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("x/*b", "x/ab", True),
+        ("x/*b", "x/a/b", False),
+        ("x/?", "x/a", True),
+        ("x/?", "x/ab", False),
+        ("exp*", "expA/sub", True),
+        ("[ab]x", "bx", True),
+        ("[!ab]x", "cx", True),
+        ("[!ab]x", "ax", False),
+    ],
+)
+def test_wildcards_do_not_cross_slash(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("**/tmp", "tmp", True),
+        ("**/tmp", "X/Y/tmp", True),
+        ("a/**/b", "a/b", True),
+        ("a/**/b", "a/x/y/b", True),
+        ("a/**/b", "x/a/b", False),
+    ],
+)
+def test_double_star_prefix(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [("Archive", True), ("Archive/Sub", True), ("Archived", False), ("X/Archive", False)],
+)
+def test_trailing_double_star_covers_the_collection_itself(path, expected):
+    assert ignored("Archive/**", path) is expected
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("A/*\n!A/keep", "A/keep", False),
+        ("A/*\n!A/keep", "A/keep/sub", False),
+        ("A/*\n!A/keep", "A/drop", True),
+        ("B\n!B", "A/B", False),
+        ("!B\nB", "A/B", True),
+        # A child of an ignored parent cannot be re-included.
+        ("A\n!A/keep", "A/keep", True),
+    ],
+)
+def test_negation(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+def test_comments_and_blank_lines():
+    pattern = "# B\n\n   \n  C  \n"
+    assert not ignored(pattern, "B")
+    assert ignored(pattern, "C")
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("\\#x", "#x", True),
+        ("\\!x", "!x", True),
+        ("\\*", "*", True),
+        ("\\*", "a", False),
+    ],
+)
+def test_escapes(pattern, path, expected):
+    assert ignored(pattern, path) is expected
+
+
+@pytest.mark.parametrize("bad", ["[z-a]", "[[:alpha:]]"])
+def test_invalid_bracket_is_skipped(bad, recwarn):
+    assert ignored(f"{bad}\nB", "A/B")
+    assert not ignored(f"{bad}\nB", "z")
+    assert not recwarn.list
+
+
+def test_filter_corpus():
+    corpus = [
+        {"key": "1", "paths": ["Archive"]},
+        {"key": "2", "paths": ["Reading/Now", "Archive/old"]},
+        {"key": "3", "paths": ["Reading/Now"]},
+        {"key": "4", "paths": []},
+    ]
+    kept = filter_corpus(corpus, "Archive/**")
+    assert [c["key"] for c in kept] == ["3", "4"]